@@ -3,12 +3,35 @@ Dashboard for Gemini AI Assistant - Comprehensive project analytics and manageme
 """
 
 import os
+import heapq
 import json
+import sqlite3
+import pandas as pd
 import streamlit as st
 from datetime import datetime, timedelta
 from collections import Counter
-import firebase_admin
-from firebase_admin import credentials, auth, db
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+try:
+    import orjson
+
+    def json_loads(data):
+        return orjson.loads(data)
+
+    def json_dumps(obj, indent=False):
+        option = orjson.OPT_INDENT_2 if indent else 0
+        return orjson.dumps(obj, option=option).decode('utf-8')
+except ImportError:
+    # Fall back to stdlib json when orjson isn't installed
+    def json_loads(data):
+        return json.loads(data)
+
+    def json_dumps(obj, indent=False):
+        if indent:
+            return json.dumps(obj, indent=2, ensure_ascii=False)
+        # Compact separators to match orjson's output
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
 
 # Page config
 st.set_page_config(
@@ -48,11 +71,38 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 HISTORY_DIR = "user_histories"
-
-
+CHATS_DB = "chats.db"
+
+# Display names for language/mode codes, built once at import
+LANG_NAMES = {
+    'en': '🇬🇧 English',
+    'es': '🇪🇸 Spanish',
+    'fr': '🇫🇷 French',
+    'de': '🇩🇪 German',
+    'zh': '🇨🇳 Chinese',
+    'ja': '🇯🇵 Japanese',
+    'pt': '🇵🇹 Portuguese',
+    'ru': '🇷🇺 Russian',
+}
+
+MODE_NAMES = {
+    'chat': '💬 Chat',
+    'qa': '❓ Q&A',
+    'analysis': '🔍 Analysis',
+}
+
+
+@st.cache_resource
 def init_firebase():
-    """Initialize Firebase connection."""
+    """Initialize Firebase connection (once per process).
+
+    firebase_admin is imported here rather than at module scope so the
+    dashboard starts fast when Firebase isn't configured.
+    """
     try:
+        import firebase_admin
+        from firebase_admin import credentials
+
         if firebase_admin._apps:
             return True
         
@@ -65,47 +115,180 @@ def init_firebase():
         return False
 
 
-def get_all_users():
-    """Get list of all users from Firebase."""
+def _fetch_user_conversations(uid):
+    """Fetch one user's conversations (used by the parallel fallback)."""
     try:
-        snapshot = db.reference('users').get()
-        if snapshot.val():
-            return list(snapshot.val().keys())
-        return []
+        from firebase_admin import db
+        return uid, db.reference(f'users/{uid}/conversations').get() or {}
     except:
-        return []
+        return uid, {}
+
+
+def get_users_snapshot():
+    """Fetch the entire users subtree from Firebase in a single read.
 
+    Returns a dict of {uid: user_data} so callers can iterate users and
+    their conversations locally instead of issuing one request per user.
+    If the single subtree read fails (e.g. the payload is too large),
+    falls back to a shallow key listing plus parallel per-user fetches,
+    so total latency is the slowest round-trip instead of their sum.
+    """
+    try:
+        from firebase_admin import db
+    except ImportError:
+        return {}
 
-def get_user_conversations(uid):
-    """Get all conversations for a specific user."""
     try:
-        snapshot = db.reference(f'users/{uid}/conversations').get()
-        if snapshot.val():
-            return list(snapshot.val().values())
-        return []
+        snapshot = db.reference('users').get()
+        if snapshot:
+            return snapshot
     except:
-        return []
+        pass
+
+    try:
+        uids = list(db.reference('users').get(shallow=True) or {})
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            return {
+                uid: {'conversations': conversations}
+                for uid, conversations in executor.map(_fetch_user_conversations, uids)
+            }
+    except:
+        return {}
+
+
+# Per-file parse cache keyed by (mtime, size) so unchanged history files
+# are never re-read or re-parsed between scans. Each entry stores the
+# parsed conversations plus their precomputed aggregates.
+_history_cache = {}
+
+
+def _summarize_history(conversations):
+    """Compute one user file's aggregates in a single pass."""
+    summary = {
+        'msg_count': len(conversations),
+        'last_ts': '',
+        'languages': Counter(),
+        'modes': Counter(),
+        'chars_sent': 0,
+        'chars_received': 0,
+    }
+    for conv in conversations:
+        ts = conv.get('timestamp', '')
+        if ts > summary['last_ts']:
+            summary['last_ts'] = ts
+        summary['languages'][conv.get('language', 'en')] += 1
+        summary['modes'][conv.get('mode', 'chat')] += 1
+        summary['chars_sent'] += len(conv.get('prompt', ''))
+        summary['chars_received'] += len(conv.get('response', ''))
+    return summary
+
+
+# Parsed rows and summaries from chats.db, keyed by the file's
+# (mtime, size) so the database is only re-read when it changes
+_sqlite_cache = (None, {}, {})
 
 
+def _load_sqlite_histories():
+    """Read per-user histories from the SQLite store written by streamlit_ui.
+
+    Returns ({user_id: conversations}, {user_id: summary}); both are
+    cached against the database file's (mtime, size).
+    """
+    global _sqlite_cache
+    try:
+        stat = os.stat(CHATS_DB)
+    except OSError:
+        return {}, {}
+
+    key = (stat.st_mtime, stat.st_size)
+    if _sqlite_cache[0] == key:
+        return _sqlite_cache[1], _sqlite_cache[2]
+
+    try:
+        conn = sqlite3.connect(CHATS_DB)
+        try:
+            rows = conn.execute(
+                "SELECT uid, ts, mode, lang, prompt, response FROM chats ORDER BY ts"
+            ).fetchall()
+        finally:
+            conn.close()
+    except Exception:
+        return {}, {}
+
+    histories = {}
+    for uid, ts, mode, lang, prompt, response in rows:
+        histories.setdefault(uid, []).append({
+            'timestamp': ts,
+            'mode': mode,
+            'language': lang,
+            'prompt': prompt,
+            'response': response,
+        })
+    summaries = {uid: _summarize_history(convs) for uid, convs in histories.items()}
+    _sqlite_cache = (key, histories, summaries)
+    return histories, summaries
+
+
+@st.cache_data(ttl=60)
 def get_all_local_histories():
-    """Get all local user history files."""
+    """Get all local user history files.
+
+    Only files whose mtime/size changed since the last scan are re-read;
+    everything else is served from the in-process parse cache.
+    """
     histories = {}
-    if not os.path.exists(HISTORY_DIR):
-        return histories
-    
     try:
-        for filename in os.listdir(HISTORY_DIR):
-            if filename.startswith('chat_history_') and filename.endswith('.json'):
-                user_id = filename.replace('chat_history_', '').replace('.json', '')
-                path = os.path.join(HISTORY_DIR, filename)
-                with open(path, 'r', encoding='utf-8') as f:
-                    histories[user_id] = json.load(f)
+        for path in Path(HISTORY_DIR).glob('chat_history_*.json*'):
+            if path.suffix not in ('.json', '.jsonl'):
+                continue
+            user_id = path.stem.removeprefix('chat_history_')
+
+            stat = path.stat()
+            cached = _history_cache.get(user_id)
+            if cached and cached[0] == (stat.st_mtime, stat.st_size):
+                histories[user_id] = cached[1]
+                continue
+
+            with path.open('rb') as f:
+                raw = f.read()
+            if path.suffix == '.jsonl':
+                # Append-only format written by streamlit_ui: one entry per line
+                parsed = [json_loads(line) for line in raw.splitlines() if line.strip()]
+            else:
+                parsed = json_loads(raw)
+            _history_cache[user_id] = (
+                (stat.st_mtime, stat.st_size), parsed, _summarize_history(parsed)
+            )
+            histories[user_id] = parsed
     except:
         pass
-    
+
+    # The SQLite store written by streamlit_ui is canonical for users
+    # already migrated off JSON files
+    sqlite_histories, _ = _load_sqlite_histories()
+    histories.update(sqlite_histories)
+
     return histories
 
 
+@st.cache_data(ttl=60)
+def get_local_history_summaries():
+    """Get precomputed per-user aggregates for all local history files.
+
+    The aggregates are computed in the same pass that parses each file,
+    so reruns never re-walk the conversation lists.
+    """
+    histories = get_all_local_histories()
+    summaries = {
+        user_id: cached[2]
+        for user_id, cached in _history_cache.items()
+        if user_id in histories
+    }
+    summaries.update(_load_sqlite_histories()[1])
+    return summaries
+
+
+@st.cache_data(ttl=30)
 def calculate_stats():
     """Calculate comprehensive project statistics."""
     stats = {
@@ -123,77 +306,100 @@ def calculate_stats():
     firebase_ok = init_firebase()
     stats['firebase_enabled'] = firebase_ok
     
-    response_lengths = []
-    today = datetime.now().date()
+    response_len_sum = 0
+    response_len_count = 0
+    # ISO timestamps sort and compare lexicographically, so "active
+    # today" is a cheap prefix check rather than datetime parsing.
+    today_prefix = datetime.now().strftime('%Y-%m-%d')
     active_users_today = set()
-    
+
     if firebase_ok:
         try:
-            users = get_all_users()
-            stats['total_users'] = len(users)
-            
-            for uid in users:
-                conversations = get_user_conversations(uid)
+            users_snapshot = get_users_snapshot()
+            stats['total_users'] = len(users_snapshot)
+
+            for uid, udata in users_snapshot.items():
+                user_stats = udata.get('stats')
+                if user_stats:
+                    # Prefer the compact per-user stats summary maintained
+                    # by save_conversation_to_user over hydrating every
+                    # conversation's full prompt/response payload.
+                    count = user_stats.get('count', 0)
+                    stats['total_conversations'] += count
+                    stats['total_messages'] += count
+                    for lang, n in (user_stats.get('languages') or {}).items():
+                        stats['languages_used'][lang] += n
+                    for mode, n in (user_stats.get('modes') or {}).items():
+                        stats['modes_used'][mode] += n
+                    response_len_sum += user_stats.get('sum_response_len', 0)
+                    response_len_count += count
+
+                    if user_stats.get('last_ts', '').startswith(today_prefix):
+                        active_users_today.add(uid)
+                    continue
+
+                conversations = list((udata.get('conversations') or {}).values())
                 stats['total_conversations'] += len(conversations)
-                
+
                 for conv in conversations:
                     stats['total_messages'] += 1
                     if 'language' in conv:
                         stats['languages_used'][conv.get('language', 'unknown')] += 1
                     if 'mode' in conv:
                         stats['modes_used'][conv.get('mode', 'unknown')] += 1
-                    
+
                     response = conv.get('response', '')
                     if response:
-                        response_lengths.append(len(response))
-                    
+                        response_len_sum += len(response)
+                        response_len_count += 1
+
                     # Check if active today
-                    try:
-                        timestamp = datetime.fromisoformat(conv.get('timestamp', ''))
-                        if timestamp.date() == today:
-                            active_users_today.add(uid)
-                    except:
-                        pass
+                    if conv.get('timestamp', '').startswith(today_prefix):
+                        active_users_today.add(uid)
         except:
             pass
     
-    # Add local histories
+    # Add local histories (vectorized with pandas rather than per-dict loops)
     try:
         local_histories = get_all_local_histories()
         stats['total_users'] = max(stats['total_users'], len(local_histories))
-        
-        for user_id, conversations in local_histories.items():
-            if not firebase_ok or user_id == 'guest':  # Count local guest conversations
-                stats['total_conversations'] += len(conversations)
-                
-                for conv in conversations:
-                    stats['total_messages'] += 1
-                    if 'language' in conv:
-                        stats['languages_used'][conv.get('language', 'unknown')] += 1
-                    if 'mode' in conv:
-                        stats['modes_used'][conv.get('mode', 'unknown')] += 1
-                    
-                    response = conv.get('response', '')
-                    if response:
-                        response_lengths.append(len(response))
-                    
-                    try:
-                        timestamp = datetime.fromisoformat(conv.get('timestamp', ''))
-                        if timestamp.date() == today:
-                            active_users_today.add(user_id)
-                    except:
-                        pass
+
+        rows = [
+            {**conv, 'user_id': user_id}
+            for user_id, conversations in local_histories.items()
+            if not firebase_ok or user_id == 'guest'  # Count local guest conversations
+            for conv in conversations
+        ]
+        if rows:
+            df = pd.DataFrame(rows)
+            stats['total_conversations'] += len(df)
+            stats['total_messages'] += len(df)
+
+            if 'language' in df.columns:
+                stats['languages_used'].update(df['language'].dropna().value_counts().to_dict())
+            if 'mode' in df.columns:
+                stats['modes_used'].update(df['mode'].dropna().value_counts().to_dict())
+
+            if 'response' in df.columns:
+                lengths = df['response'].fillna('').str.len()
+                response_len_sum += int(lengths.sum())
+                response_len_count += int((lengths > 0).sum())
+
+            if 'timestamp' in df.columns:
+                active = df['timestamp'].fillna('').astype(str).str.startswith(today_prefix)
+                active_users_today.update(df.loc[active, 'user_id'].unique())
     except:
         pass
-    
+
     stats['active_today'] = len(active_users_today)
     
-    if response_lengths:
-        stats['avg_response_length'] = int(sum(response_lengths) / len(response_lengths))
+    if response_len_count:
+        stats['avg_response_length'] = int(response_len_sum / response_len_count)
     
     return stats
 
 
+@st.cache_data(ttl=30)
 def get_recent_conversations(limit=10):
     """Get recent conversations across all users."""
     convs = []
@@ -207,12 +413,19 @@ def get_recent_conversations(limit=10):
     except:
         pass
     
-    # Sort by timestamp
+    # ISO timestamps sort correctly as plain strings. For small limits a
+    # bounded heap (O(N log limit)) beats sorting everything; for
+    # export-sized limits the full sort is the right tool. The .get key
+    # keeps rows without a timestamp sortable (they sink to the end)
+    # instead of failing the whole sort.
+    key = lambda x: x.get('timestamp', '')
     try:
-        convs.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
+        if limit < len(convs):
+            return heapq.nlargest(limit, convs, key=key)
+        convs.sort(key=key, reverse=True)
     except:
         pass
-    
+
     return convs[:limit]
 
 
@@ -270,22 +483,11 @@ def show_usage_analytics(stats):
     with col1:
         st.markdown("#### Languages Used")
         if stats['languages_used']:
-            lang_data = dict(stats['languages_used'])
-            lang_names = {
-                'en': '🇬🇧 English',
-                'es': '🇪🇸 Spanish',
-                'fr': '🇫🇷 French',
-                'de': '🇩🇪 German',
-                'zh': '🇨🇳 Chinese',
-                'ja': '🇯🇵 Japanese',
-                'pt': '🇵🇹 Portuguese',
-                'ru': '🇷🇺 Russian',
+            # Single pass, ordered by frequency
+            display_data = {
+                LANG_NAMES.get(code, code): count
+                for code, count in stats['languages_used'].most_common()
             }
-            
-            display_data = {}
-            for lang_code, count in lang_data.items():
-                display_data[lang_names.get(lang_code, lang_code)] = count
-            
             st.bar_chart(display_data)
         else:
             st.info("No language data available")
@@ -293,23 +495,16 @@ def show_usage_analytics(stats):
     with col2:
         st.markdown("#### Conversation Modes")
         if stats['modes_used']:
-            mode_data = dict(stats['modes_used'])
-            mode_names = {
-                'chat': '💬 Chat',
-                'qa': '❓ Q&A',
-                'analysis': '🔍 Analysis',
+            display_data = {
+                MODE_NAMES.get(mode, mode): count
+                for mode, count in stats['modes_used'].most_common()
             }
-            
-            display_data = {}
-            for mode, count in mode_data.items():
-                display_data[mode_names.get(mode, mode)] = count
-            
             st.bar_chart(display_data)
         else:
             st.info("No mode data available")
 
 
-def show_system_status(stats):
+def show_system_status(stats, histories):
     """Display system status."""
     st.subheader("⚙️ System Status")
     
@@ -320,15 +515,14 @@ def show_system_status(stats):
         st.info(f"**Firebase**: {firebase_status}")
     
     with col2:
-        local_histories = get_all_local_histories()
-        st.info(f"**Local Histories**: {len(local_histories)} users")
+        st.info(f"**Local Histories**: {len(histories)} users")
     
     with col3:
         try:
-            with open("knowledge_base.json", "r") as f:
-                kb = json.load(f)
-                st.info(f"**Knowledge Base**: {len(str(kb))} chars")
-        except:
+            # One stat syscall; no need to parse the file just to size it
+            kb_size = os.path.getsize("knowledge_base.json")
+            st.info(f"**Knowledge Base**: {kb_size} chars")
+        except OSError:
             st.info("**Knowledge Base**: Not found")
 
 
@@ -358,7 +552,7 @@ def show_recent_activity(limit=10):
         st.info("No conversations yet")
 
 
-def show_user_management():
+def show_user_management(histories):
     """Display user management section."""
     st.subheader("👥 User Management")
     
@@ -366,28 +560,18 @@ def show_user_management():
     
     with tab1:
         try:
-            local_histories = get_all_local_histories()
-            if local_histories:
+            summaries = get_local_history_summaries()
+            if summaries:
                 user_data = []
-                for user_id, conversations in local_histories.items():
-                    last_active = "Never"
-                    msg_count = len(conversations)
-                    
-                    if conversations:
-                        try:
-                            timestamps = [conv.get('timestamp', '') for conv in conversations]
-                            timestamps = [t for t in timestamps if t]
-                            if timestamps:
-                                last_active = max(timestamps)[:10]
-                        except:
-                            pass
-                    
+                for user_id, summary in summaries.items():
+                    last_active = summary['last_ts'][:10] if summary['last_ts'] else "Never"
+
                     user_data.append({
                         "User ID": user_id[:20],
-                        "Messages": msg_count,
+                        "Messages": summary['msg_count'],
                         "Last Active": last_active,
                     })
-                
+
                 st.dataframe(user_data, use_container_width=True, hide_index=True)
             else:
                 st.info("No local user data available")
@@ -396,18 +580,18 @@ def show_user_management():
     
     with tab2:
         st.markdown("#### User Details")
-        local_histories = get_all_local_histories()
-        if local_histories:
-            selected_user = st.selectbox("Select user:", list(local_histories.keys()))
+        if histories:
+            selected_user = st.selectbox("Select user:", list(histories.keys()))
             
             if selected_user:
-                conversations = local_histories[selected_user]
-                st.metric("Total Conversations", len(conversations))
-                
-                # Calculate stats for this user
-                total_chars_sent = sum(len(c.get('prompt', '')) for c in conversations)
-                total_chars_received = sum(len(c.get('response', '')) for c in conversations)
-                avg_response = total_chars_received // len(conversations) if conversations else 0
+                summary = get_local_history_summaries().get(selected_user, {})
+                msg_count = summary.get('msg_count', 0)
+                st.metric("Total Conversations", msg_count)
+
+                # Precomputed stats for this user
+                total_chars_sent = summary.get('chars_sent', 0)
+                total_chars_received = summary.get('chars_received', 0)
+                avg_response = total_chars_received // msg_count if msg_count else 0
                 
                 col1, col2, col3 = st.columns(3)
                 with col1:
@@ -418,20 +602,12 @@ def show_user_management():
                     st.metric("Avg Response Length", avg_response)
                 
                 # Language breakdown
-                lang_counter = Counter(c.get('language', 'en') for c in conversations)
-                lang_names = {
-                    'en': '🇬🇧 English',
-                    'es': '🇪🇸 Spanish',
-                    'fr': '🇫🇷 French',
-                    'de': '🇩🇪 German',
-                    'zh': '🇨🇳 Chinese',
-                    'ja': '🇯🇵 Japanese',
-                    'pt': '🇵🇹 Portuguese',
-                    'ru': '🇷🇺 Russian',
-                }
-                
+                lang_counter = summary.get('languages', Counter())
+
                 st.markdown("**Languages Used**:")
-                lang_display = {lang_names.get(k, k): v for k, v in lang_counter.items()}
+                lang_display = {
+                    LANG_NAMES.get(k, k): v for k, v in lang_counter.most_common()
+                }
                 st.bar_chart(lang_display)
         else:
             st.info("No user data available")
@@ -461,7 +637,7 @@ def show_export_section():
             
             st.download_button(
                 label="Download Analytics JSON",
-                data=json.dumps(export_data, indent=2),
+                data=json_dumps(export_data, indent=True),
                 file_name=f"analytics_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
                 mime="application/json",
             )
@@ -471,7 +647,7 @@ def show_export_section():
             conversations = get_recent_conversations(limit=10000)
             st.download_button(
                 label="Download Conversations JSON",
-                data=json.dumps(conversations, indent=2, ensure_ascii=False),
+                data=json_dumps(conversations, indent=True),
                 file_name=f"conversations_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
                 mime="application/json",
             )
@@ -480,10 +656,15 @@ def show_export_section():
 def main():
     """Main dashboard function."""
     show_header()
-    
-    # Calculate statistics
+
+    # Load local histories once per render and thread them through the
+    # sections that need them. calculate_stats/get_recent_conversations
+    # stay parameter-less: they are st.cache_data-wrapped (a dict
+    # argument would be hashed into their cache key) and hit the cached
+    # loader internally.
+    histories = get_all_local_histories()
     stats = calculate_stats()
-    
+
     # Display sections
     show_metrics(stats)
     
@@ -493,7 +674,7 @@ def main():
     with col1:
         show_usage_analytics(stats)
     with col2:
-        show_system_status(stats)
+        show_system_status(stats, histories)
     
     st.divider()
     
@@ -501,7 +682,7 @@ def main():
     
     st.divider()
     
-    show_user_management()
+    show_user_management(histories)
     
     st.divider()
     
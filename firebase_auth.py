@@ -186,6 +186,46 @@ def save_user_preferences(uid: str, preferences: dict):
     return update_user_profile(uid, {'preferences': preferences})
 
 
+def update_user_stats(uid: str, conversation: dict, timestamp: str):
+    """Update the per-user stats summary node in Firebase.
+
+    Maintains a small `users/{uid}/stats` document with aggregate counters
+    (count, language/mode histograms, response length sum, last timestamp)
+    so the dashboard can read one compact node per user instead of
+    downloading the full conversation history.
+
+    Args:
+        uid: User ID
+        conversation: Conversation entry being saved
+        timestamp: ISO timestamp of the conversation
+
+    Returns:
+        bool: Success status
+    """
+    def _apply(stats):
+        stats = stats or {}
+        stats['count'] = stats.get('count', 0) + 1
+        language = conversation.get('language', 'en')
+        mode = conversation.get('mode', 'chat')
+        languages = stats.setdefault('languages', {})
+        languages[language] = languages.get(language, 0) + 1
+        modes = stats.setdefault('modes', {})
+        modes[mode] = modes.get(mode, 0) + 1
+        stats['sum_response_len'] = (
+            stats.get('sum_response_len', 0) + len(conversation.get('response', ''))
+        )
+        stats['last_ts'] = timestamp
+        return stats
+
+    try:
+        initialize_firebase()
+        db.reference(f'users/{uid}/stats').transaction(_apply)
+        return True
+    except Exception as e:
+        st.error(f"Error updating user stats: {e}")
+        return False
+
+
 def save_conversation_to_user(uid: str, conversation: dict):
     """Save a conversation to user's history in Firebase.
     
@@ -199,13 +239,18 @@ def save_conversation_to_user(uid: str, conversation: dict):
     try:
         initialize_firebase()
         timestamp = datetime.now().isoformat()
-        db.reference(f'users/{uid}/conversations/{timestamp}').set(conversation)
-        
-        # Update interaction count
-        profile = db.reference(f'users/{uid}/profile').get().val()
-        count = profile.get('interaction_count', 0) + 1
-        db.reference(f'users/{uid}/profile/interaction_count').set(count)
-        
+        # One atomic multi-path update instead of a conversation write, a
+        # profile read and an interaction-count write (3 round-trips).
+        # The {'.sv': ...} server value increments the counter without
+        # reading the profile first.
+        db.reference(f'users/{uid}').update({
+            f'conversations/{timestamp}': conversation,
+            'profile/interaction_count': {'.sv': {'increment': 1}},
+        })
+
+        # Keep the dashboard's per-user stats summary in sync
+        update_user_stats(uid, conversation, timestamp)
+
         return True
     except Exception as e:
         st.error(f"Error saving conversation: {e}")
@@ -224,19 +269,24 @@ def get_user_conversations(uid: str, limit: int = 50):
     """
     try:
         initialize_firebase()
-        conversations = db.reference(f'users/{uid}/conversations').get().val()
-        
+        # Conversation keys are ISO timestamps, so order_by_key with
+        # limit_to_last fetches only the newest `limit` entries
+        # server-side instead of downloading the whole history.
+        conversations = (
+            db.reference(f'users/{uid}/conversations')
+            .order_by_key()
+            .limit_to_last(limit)
+            .get()
+        )
+
         if not conversations:
             return []
-        
-        # Convert to list and sort by timestamp (newest first)
-        conv_list = [
-            {**conv, 'timestamp': ts} 
-            for ts, conv in conversations.items()
+
+        # Results arrive in ascending key order; return newest first
+        return [
+            {**conv, 'timestamp': ts}
+            for ts, conv in reversed(list(conversations.items()))
         ]
-        conv_list.sort(key=lambda x: x['timestamp'], reverse=True)
-        
-        return conv_list[:limit]
     except Exception as e:
         st.error(f"Error retrieving conversations: {e}")
         return []
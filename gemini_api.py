@@ -1,25 +1,27 @@
 import os
-from google import genai
-from pypdf import PdfReader
 
 _client = None
 
 
 def extract_text_from_pdf(pdf_file):
     """Extract text from a PDF file object.
-    
+
+    pypdf is imported lazily so callers that never touch PDFs don't pay
+    its import cost.
+
     Args:
         pdf_file: A file-like object containing PDF data
-        
+
     Returns:
         str: Extracted text from all pages in the PDF
     """
     try:
+        from pypdf import PdfReader
+
         reader = PdfReader(pdf_file)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
-        return text.strip()
+        # Join once at the end; += on a string is quadratic in the worst case
+        parts = [page.extract_text() for page in reader.pages]
+        return "\n".join(parts).strip()
     except Exception as e:
         raise RuntimeError(f"Failed to extract text from PDF: {e}") from e
 
@@ -42,12 +44,36 @@ def get_client():
         )
 
     try:
-        _client = genai.Client(api_key=api_key)
+        from google import genai
+
+        # A single module-level client keeps one pooled HTTP session, so
+        # successive calls reuse the TLS connection instead of paying a
+        # fresh handshake per request. The timeout is in milliseconds.
+        _client = genai.Client(
+            api_key=api_key,
+            http_options={"timeout": 60_000},
+        )
         return _client
     except Exception as e:
         raise RuntimeError(f"Failed to initialize Gemini client: {e}") from e
 
 
+def create_chat(system_instruction=None, model="gemini-2.5-flash"):
+    """Create a Gemini chat session that tracks conversation history.
+
+    The SDK keeps the history client-side and retransmits it (with the
+    system instruction) on each `send_message`, so token cost still
+    grows with conversation length; the win is that callers no longer
+    rebuild and serialize the transcript themselves on every turn.
+    """
+    try:
+        client = get_client()
+        config = {"system_instruction": system_instruction} if system_instruction else None
+        return client.chats.create(model=model, config=config)
+    except Exception as e:
+        raise RuntimeError(f"Failed to create Gemini chat session: {e}") from e
+
+
 def get_response(prompt, model="gemini-2.5-flash"):
     """Send `prompt` to Gemini and return the response text.
 
@@ -62,3 +88,18 @@ def get_response(prompt, model="gemini-2.5-flash"):
         # Surface a friendly error that callers (e.g., the UI) can display.
         raise RuntimeError(f"Error generating response from Gemini: {e}") from e
 
+
+def get_response_stream(prompt, model="gemini-2.5-flash"):
+    """Stream the Gemini response as an iterator of text chunks.
+
+    Total generation time is unchanged, but callers can render tokens as
+    they arrive, so perceived latency drops to time-to-first-token.
+    """
+    try:
+        client = get_client()
+        for chunk in client.models.generate_content_stream(model=model, contents=prompt):
+            if chunk.text:
+                yield chunk.text
+    except Exception as e:
+        raise RuntimeError(f"Error generating response from Gemini: {e}") from e
+
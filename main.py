@@ -1,49 +1,59 @@
 import json
-from gemini_api import get_response
+from gemini_api import create_chat
 
-# Load knowledge base
-with open("knowledge_base.json") as f:
-    data = json.load(f)
-
-context = str(data)
+try:
+    import orjson
 
-# Conversation history
-chat_history = []
-
-print("Multilingual College Assistant (type exit to quit)")
+    def json_loads(data):
+        return orjson.loads(data)
 
-while True:
-    query = input("You: ")
+    def json_dumps(obj):
+        return orjson.dumps(obj).decode('utf-8')
+except ImportError:
+    # Fall back to stdlib json when orjson isn't installed
+    def json_loads(data):
+        return json.loads(data)
 
-    if query.lower() == "exit":
-        break
+    def json_dumps(obj):
+        # Compact separators to match orjson's output
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
 
-    # Add user message to history
-    chat_history.append(f"User: {query}")
-
-    prompt = f"""
-    You are a multilingual college assistant.
+# Load knowledge base
+with open("knowledge_base.json", "rb") as f:
+    data = json_loads(f.read())
 
-    RULES:
-    - Reply in same language as user
-    - Use ONLY this college data
-    - Remember previous conversation
+# Serialize once as real JSON; str(dict) would produce a larger,
+# non-JSON repr and get copied into the prompt on every turn
+context = json_dumps(data)
 
-    COLLEGE DATA:
-    {context}
+# Static instructions + college data, sent once as the system
+# instruction instead of being resent with every turn
+SYSTEM_INSTRUCTION = f"""
+You are a multilingual college assistant.
 
-    CONVERSATION HISTORY:
-    {chat_history}
+RULES:
+- Reply in same language as user
+- Use ONLY this college data
+- Remember previous conversation
 
-    Latest Question: {query}
-    """
+COLLEGE DATA:
+{context}
+"""
 
-    answer = get_response(prompt)
+# The SDK chat session tracks history client-side and resends it (plus
+# the system instruction) with every send_message, so token cost still
+# grows with conversation length; what this saves is our own manual
+# transcript rebuilding and str(dict) serialization per turn
+chat = create_chat(system_instruction=SYSTEM_INSTRUCTION)
 
-    print("Assistant:", answer)
+print("Multilingual College Assistant (type exit to quit)")
 
-    # Save assistant reply
-    chat_history.append(f"Assistant: {answer}")
+while True:
+    query = input("You: ")
 
+    if query.lower() == "exit":
+        break
 
+    response = chat.send_message(query)
 
+    print("Assistant:", response.text)
@@ -1,8 +1,34 @@
+import io
 import os
 import json
+import time
+import sqlite3
 import streamlit as st
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from gemini_api import get_response, extract_text_from_pdf
+from itertools import islice
+from gemini_api import get_response_stream, extract_text_from_pdf
+
+try:
+    import orjson
+
+    def json_loads(data):
+        return orjson.loads(data)
+
+    def json_dumps_bytes(obj, indent=False):
+        option = orjson.OPT_INDENT_2 if indent else 0
+        return orjson.dumps(obj, option=option)
+except ImportError:
+    # Fall back to stdlib json when orjson isn't installed
+    def json_loads(data):
+        return json.loads(data)
+
+    def json_dumps_bytes(obj, indent=False):
+        if indent:
+            return json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
+        # Compact separators to match orjson's output
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
 
 # Try to load Firebase credentials from file if available
 FIREBASE_CREDS_FILE = "firebase-credentials.json"
@@ -12,7 +38,12 @@ HAS_LOCAL_FIREBASE = os.path.exists(FIREBASE_CREDS_FILE)
 st.set_page_config(page_title="Gemini AI Assistant", layout="wide")
 
 HISTORY_DIR = "user_histories"
-HISTORY_FILE = "chat_history.json"  # Legacy global file
+HISTORY_FILE = "chat_history.jsonl"  # Legacy global file
+CHATS_DB = "chats.db"
+
+# Cap on in-session history; a bounded deque gives O(1) prepends and
+# rotates out the oldest entries automatically
+HISTORY_MAXLEN = 500
 
 LANGUAGES = {
     "English": "en",
@@ -31,6 +62,27 @@ MODES = {
     "Analysis": "analysis",
 }
 
+# Instruction tables, built once at import instead of on every call in
+# the rerun hot path
+MODE_INSTRUCTIONS = {
+    "chat": "You are a helpful, conversational AI assistant. Keep responses friendly and engaging.",
+    "qa": "You are a Q&A expert. Provide clear, concise, direct answers to questions. Focus on accuracy and brevity.",
+    "analysis": "You are an analytical expert. Provide deep, thorough analysis with data-driven insights and detailed explanations.",
+}
+
+LANGUAGE_INSTRUCTIONS = {
+    code: "" if code == "en" else f"\n\nRespond in {name}."
+    for name, code in LANGUAGES.items()
+}
+
+# Every (mode, language) instruction pair pre-concatenated at import, so
+# the send path starts from a single dict lookup
+PROMPT_PREFIX = {
+    (mode, lang): MODE_INSTRUCTIONS[mode] + LANGUAGE_INSTRUCTIONS[lang]
+    for mode in MODE_INSTRUCTIONS
+    for lang in LANGUAGES.values()
+}
+
 
 def ensure_user_history_dir():
     """Ensure user history directory exists."""
@@ -41,7 +93,7 @@ def ensure_user_history_dir():
 def get_user_history_path(user_id):
     """Get the chat history file path for a specific user."""
     ensure_user_history_dir()
-    return os.path.join(HISTORY_DIR, f"chat_history_{user_id}.json")
+    return os.path.join(HISTORY_DIR, f"chat_history_{user_id}.jsonl")
 
 
 def init_firebase():
@@ -68,45 +120,187 @@ def init_firebase():
         return False, str(e)
 
 
+# Pretty-print only files below this size; above it the parse + indented
+# re-serialization roughly triples peak memory for a blob that is only
+# shown in an editable text area anyway.
+KB_PRETTY_PRINT_LIMIT = 256 * 1024
+
+
+@st.cache_data(show_spinner=False)
+def _load_kb_cached(path, mtime):
+    """Read the knowledge base as text, pretty-printing small files.
+
+    `mtime` is part of the cache key so edits to the file invalidate
+    the cached string; reruns with an unchanged file are O(1).
+    """
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+    except Exception:
+        return ""
+
+    if len(raw) < KB_PRETTY_PRINT_LIMIT:
+        try:
+            return json_dumps_bytes(json_loads(raw), indent=True).decode("utf-8")
+        except Exception:
+            pass
+    return raw.decode("utf-8", "ignore")
+
+
 def load_knowledge_base(path="knowledge_base.json"):
-    """Load knowledge base from JSON file."""
+    """Load knowledge base from JSON file (cached until the file changes)."""
     if not os.path.exists(path):
         return ""
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            return json.dumps(data, indent=2, ensure_ascii=False)
-    except Exception:
-        with open(path, "r", encoding="utf-8", errors="ignore") as f:
-            return f.read()
+    return _load_kb_cached(path, os.path.getmtime(path))
 
 
-def load_chat_history(user_id=None, path=None):
-    """Load chat history from file.
-    
-    If user_id is provided, loads user-specific history.
-    If path is provided, uses that path instead.
-    Falls back to global history file if neither is provided.
+@st.cache_resource
+def get_db():
+    """Open (and initialize) the shared SQLite history database."""
+    conn = sqlite3.connect(CHATS_DB, check_same_thread=False)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS chats("
+        "uid TEXT, ts TEXT, mode TEXT, lang TEXT, prompt TEXT, response TEXT)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_chats_uid_ts ON chats(uid, ts DESC)")
+    conn.commit()
+    return conn
+
+
+def _load_history_file(user_id=None, path=None):
+    """Read a legacy JSONL/JSON history file (newest first).
+
+    Kept for migrating pre-SQLite histories into the database.
     """
     if path is None:
         if user_id:
             path = get_user_history_path(user_id)
         else:
             path = HISTORY_FILE
-    
+
     if not os.path.exists(path):
+        # Fall back to the even older .json list format
+        legacy = os.path.splitext(path)[0] + ".json"
+        if os.path.exists(legacy):
+            try:
+                with open(legacy, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except Exception:
+                return []
         return []
     try:
         with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
+            entries = [json_loads(line) for line in f if line.strip()]
+        # Entries are appended chronologically; the UI wants newest first
+        entries.reverse()
+        return entries
+    except Exception:
+        return []
+
+
+def _legacy_history_paths(user_id):
+    """Pre-SQLite history files for a user, existing ones only."""
+    path = get_user_history_path(user_id) if user_id else HISTORY_FILE
+    candidates = [path, os.path.splitext(path)[0] + ".json"]
+    return [p for p in candidates if os.path.exists(p)]
+
+
+def _retire_legacy_history(user_id, delete=False):
+    """Rename (or delete) a user's pre-SQLite history files.
+
+    Once SQLite is the source of truth the files must not be left in
+    place, or the row-count check in `_migrate_legacy_history` would
+    re-import them after a Reset Chat / Delete All. The rename prefix
+    deliberately breaks the dashboard's `chat_history_*` glob too.
+    """
+    for p in _legacy_history_paths(user_id):
+        try:
+            if delete:
+                os.remove(p)
+            else:
+                head, tail = os.path.split(p)
+                os.replace(p, os.path.join(head, f"migrated-{tail}"))
+        except OSError:
+            pass
+
+
+def _migrate_legacy_history(db, uid):
+    """One-time import of a user's file-based history into SQLite."""
+    has_rows = db.execute("SELECT 1 FROM chats WHERE uid = ? LIMIT 1", (uid,)).fetchone()
+    if has_rows:
+        return
+
+    entries = _load_history_file(user_id=uid)
+    if not entries:
+        return
+
+    db.executemany(
+        "INSERT INTO chats(uid, ts, mode, lang, prompt, response) VALUES(?, ?, ?, ?, ?, ?)",
+        [
+            (
+                uid,
+                e.get("timestamp", ""),
+                e.get("mode", "chat"),
+                e.get("language", "en"),
+                e.get("prompt", ""),
+                e.get("response", ""),
+            )
+            for e in entries
+        ],
+    )
+    db.commit()
+    # Keep the originals, but out of the migration/glob paths
+    _retire_legacy_history(uid)
+
+
+def load_chat_history(user_id=None, limit=HISTORY_MAXLEN):
+    """Load a user's chat history from SQLite (newest first).
+
+    Inserts are O(1) and this read is an indexed ORDER BY ts DESC LIMIT
+    query, so neither path scales with total stored history. Legacy
+    JSONL/JSON files are imported on first use.
+    """
+    uid = user_id or "local"
+    try:
+        db = get_db()
+        _migrate_legacy_history(db, uid)
+        rows = db.execute(
+            "SELECT ts, mode, lang, prompt, response FROM chats "
+            "WHERE uid = ? ORDER BY ts DESC LIMIT ?",
+            (uid, limit),
+        ).fetchall()
     except Exception:
         return []
+    return [
+        {
+            "timestamp": ts,
+            "mode": mode,
+            "language": lang,
+            "prompt": prompt,
+            "response": response,
+        }
+        for ts, mode, lang, prompt, response in rows
+    ]
+
+
+# Bound once on first use so per-rerun helpers skip the repeated import
+# machinery and attribute lookups
+_fb_db = None
+
+
+def _get_fb_db():
+    """Return the firebase_admin db module, importing it only once."""
+    global _fb_db
+    if _fb_db is None:
+        from firebase_admin import db
+        _fb_db = db
+    return _fb_db
 
 
 def load_user_history_from_firebase(uid):
     """Load user's conversation history from Firebase database."""
     try:
-        from firebase_admin import db
+        db = _get_fb_db()
         snapshot = db.reference(f'users/{uid}/conversations').get()
         
         # Check if snapshot exists first
@@ -125,55 +319,86 @@ def load_user_history_from_firebase(uid):
         
         # Sort by timestamp (newest first)
         conv_list.sort(key=lambda x: x['timestamp'], reverse=True)
-        st.info(f"✓ Loaded {len(conv_list)} conversations from Firebase")
         return conv_list
     except Exception as e:
-        st.error(f"Firebase load failed: {e}")
+        # May run off the main thread, so don't touch st.* here
+        print(f"Firebase load failed: {e}")
         return []
 
 
+@st.cache_resource
+def _fetch_pool():
+    """Shared worker pool for background Firebase fetches."""
+    return ThreadPoolExecutor(max_workers=4)
+
+
 def save_user_history_to_firebase(uid, conversation):
-    """Save a single conversation to user's Firebase profile."""
+    """Save a conversation to the user's Firebase profile.
+
+    Writes go through a session-level pending queue flushed with one
+    multi-location update, so entries that fail (e.g. a transient
+    network error) ride along with the next save in a single request
+    instead of costing one HTTPS round-trip each.
+    """
+    timestamp = datetime.now().isoformat()
+    # Store without timestamp in data (timestamp is the key)
+    data = {
+        "prompt": conversation.get("prompt", ""),
+        "response": conversation.get("response", ""),
+        "mode": conversation.get("mode", "chat"),
+        "language": conversation.get("language", "en"),
+    }
+
+    pending = st.session_state.setdefault("fb_pending", {})
+    pending[f'users/{uid}/conversations/{timestamp}'] = data
+
     try:
-        from firebase_admin import db
-        timestamp = datetime.now().isoformat()
-        # Store without timestamp in data (timestamp is the key)
-        data = {
-            "prompt": conversation.get("prompt", ""),
-            "response": conversation.get("response", ""),
-            "mode": conversation.get("mode", "chat"),
-            "language": conversation.get("language", "en"),
-        }
-        path = f'users/{uid}/conversations/{timestamp}'
-        db.reference(path).set(data)
+        db = _get_fb_db()
+        db.reference('/').update(dict(pending))
+        pending.clear()
         st.info(f"✓ Saved to Firebase: {uid}")
         return True
     except Exception as e:
-        st.error(f"Firebase save failed: {e}")
+        st.error(f"Firebase save failed (will retry with next save): {e}")
         return False
 
 
 
-def save_chat_history(history, user_id=None, path=None):
-    """Save chat history to file.
-    
-    If user_id is provided, saves to user-specific file.
-    If path is provided, uses that path instead.
-    Falls back to global history file if neither is provided.
-    """
-    if path is None:
-        if user_id:
-            path = get_user_history_path(user_id)
-        else:
-            path = HISTORY_FILE
-    
+def save_chat_history_entry(entry, user_id=None):
+    """Insert a single history entry into SQLite (O(1) per message)."""
+    uid = user_id or "local"
     try:
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(history, f, indent=2, ensure_ascii=False)
+        db = get_db()
+        db.execute(
+            "INSERT INTO chats(uid, ts, mode, lang, prompt, response) VALUES(?, ?, ?, ?, ?, ?)",
+            (
+                uid,
+                entry.get("timestamp", ""),
+                entry.get("mode", "chat"),
+                entry.get("language", "en"),
+                entry.get("prompt", ""),
+                entry.get("response", ""),
+            ),
+        )
+        db.commit()
     except Exception as e:
         st.error(f"Error saving history: {e}")
 
 
+def clear_chat_history(user_id=None):
+    """Delete all stored history for a user (reset/clear actions)."""
+    uid = user_id or "local"
+    try:
+        db = get_db()
+        db.execute("DELETE FROM chats WHERE uid = ?", (uid,))
+        db.commit()
+        # Also drop any not-yet-migrated legacy file, or the next
+        # load_chat_history would import it and resurrect the history
+        _retire_legacy_history(uid, delete=True)
+    except Exception as e:
+        st.error(f"Error clearing history: {e}")
+
+
 
 def firebase_login(email, password):
     """Authenticate with Firebase."""
@@ -203,22 +428,43 @@ def firebase_signup(email, password, display_name=""):
         return False, None, str(e)
 
 
-def get_mode_instruction(mode):
-    """Return system instruction based on mode."""
-    instructions = {
-        "chat": "You are a helpful, conversational AI assistant. Keep responses friendly and engaging.",
-        "qa": "You are a Q&A expert. Provide clear, concise, direct answers to questions. Focus on accuracy and brevity.",
-        "analysis": "You are an analytical expert. Provide deep, thorough analysis with data-driven insights and detailed explanations.",
-    }
-    return instructions.get(mode, instructions["chat"])
+@st.cache_data(show_spinner=False)
+def _extract_pdf_cached(file_bytes: bytes, name: str) -> str:
+    """Extract PDF text once per unique file content.
 
+    Streamlit hashes the raw bytes, so re-uploads of the same PDF (and
+    every rerun while it stays attached) reuse the cached text instead
+    of re-parsing the document.
+    """
+    return extract_text_from_pdf(io.BytesIO(file_bytes))
+
+
+@st.cache_data(show_spinner=False)
+def _history_blob(fingerprint, _history):
+    """Serialize the history for the download button, memoized.
+
+    `_history` is excluded from hashing (underscore prefix); the cheap
+    `fingerprint` tuple keys the cache, so the O(history) JSON dump runs
+    only when a message is added or removed rather than on every rerun.
+    """
+    return json_dumps_bytes(list(_history), indent=True)
 
-def get_language_instruction(language_code):
-    """Return instruction to respond in a specific language."""
-    if language_code == "en":
-        return ""
-    lang_names = {v: k for k, v in LANGUAGES.items()}
-    return f"\n\nRespond in {lang_names.get(language_code, 'English')}."
+
+@st.fragment
+def render_history(history):
+    """Render the recent-history expanders as an isolated fragment.
+
+    Widget events inside the fragment rerun only this block instead of
+    replaying the whole script with its full prompt/response strings.
+    """
+    st.subheader("📜 History")
+
+    for i, h in enumerate(islice(history, 10)):
+        timestamp = h.get("timestamp", "")[:16]
+        preview = h["prompt"][:40]
+        with st.expander(f"#{i+1} ({timestamp}) - {preview}"):
+            st.write("**Q:** " + h["prompt"])
+            st.write("**A:** " + h["response"])
 
 
 def show_login_page():
@@ -306,14 +552,19 @@ def main():
     if "firebase_enabled" not in st.session_state:
         st.session_state.firebase_enabled = st.session_state.user_id != "guest"
     if "history" not in st.session_state:
-        # Load user's history from Firebase if not guest
         firebase_ok = st.session_state.user_id != "guest"
         if firebase_ok:
-            history = load_user_history_from_firebase(st.session_state.user_id)
-            st.session_state.history = history if history else []
+            # Start the Firebase read in a worker thread and render the
+            # page immediately; the result is merged in below once it
+            # arrives, instead of blocking first paint on the round-trip
+            st.session_state.history_future = _fetch_pool().submit(
+                load_user_history_from_firebase, st.session_state.user_id
+            )
+            st.session_state.history = deque(maxlen=HISTORY_MAXLEN)
         else:
             # Load local per-user history file
-            st.session_state.history = load_chat_history(user_id=st.session_state.user_id)
+            history = load_chat_history(user_id=st.session_state.user_id)
+            st.session_state.history = deque(history or [], maxlen=HISTORY_MAXLEN)
 
     # Sidebar
     with st.sidebar:
@@ -346,10 +597,14 @@ def main():
         if st.session_state.user_id != "guest" and st.session_state.firebase_enabled:
             with st.expander("☁️ Cloud History"):
                 st.caption(f"Saved to Firebase: {st.session_state.user_email}")
-                cloud_convs = load_user_history_from_firebase(st.session_state.user_id)
-                if cloud_convs:
-                    st.info(f"✓ {len(cloud_convs)} conversations in cloud")
-                    for i, conv in enumerate(cloud_convs[:5]):
+                # Render from session history, which the background fetch
+                # fills in; a dedicated read here would block first paint
+                # on a second copy of the same Firebase query
+                if st.session_state.get("history_future") is not None:
+                    st.caption("⏳ Syncing cloud history…")
+                elif st.session_state.history:
+                    st.info(f"✓ {len(st.session_state.history)} conversations in cloud")
+                    for i, conv in enumerate(islice(st.session_state.history, 5)):
                         ts = conv.get('timestamp', '')[:10]
                         prompt = conv.get('prompt', '')[:45]
                         st.caption(f"{i+1}. {ts}: {prompt}")
@@ -365,12 +620,17 @@ def main():
             
             if st.button("🔄 Reload from Firebase", key="reload_firebase"):
                 history = load_user_history_from_firebase(st.session_state.user_id)
-                st.session_state.history = history if history else []
+                # Truncate before building the deque: entries are newest
+                # first, and a full deque evicts from the left, so feeding
+                # an oversized list would keep the oldest 500 instead
+                st.session_state.history = deque(
+                    islice(history or [], HISTORY_MAXLEN), maxlen=HISTORY_MAXLEN
+                )
                 st.rerun()
             
             if st.button("📤 View Raw Firebase Data", key="view_firebase"):
                 try:
-                    from firebase_admin import db
+                    db = _get_fb_db()
                     snapshot = db.reference(f'users/{st.session_state.user_id}/conversations').get()
                     if snapshot.val():
                         st.json(snapshot.val())
@@ -382,8 +642,8 @@ def main():
         st.divider()
         
         if st.button("🔄 Reset Chat", use_container_width=True):
-            st.session_state.history = []
-            save_chat_history([], user_id=st.session_state.user_id)
+            st.session_state.history = deque(maxlen=HISTORY_MAXLEN)
+            clear_chat_history(user_id=st.session_state.user_id)
             st.success("✓ Cleared")
             st.rerun()
 
@@ -392,7 +652,22 @@ def main():
     
     with col1:
         st.subheader("📚 Knowledge Base")
-        kb = st.text_area("Add context:", value=load_knowledge_base(), height=100)
+        # Stat the file instead of re-reading it on every rerun; the text
+        # is reloaded into session state only when the mtime changes
+        kb_path = "knowledge_base.json"
+        kb_mtime = os.path.getmtime(kb_path) if os.path.exists(kb_path) else 0
+        if st.session_state.get("kb_mtime") != kb_mtime:
+            st.session_state.kb_text = load_knowledge_base(kb_path)
+            st.session_state.kb_mtime = kb_mtime
+        kb_text = st.session_state.kb_text
+        # Mount the editor only on request; otherwise every rerun ships
+        # the full KB text to the browser even when nobody is editing it
+        if st.checkbox("✏️ Edit knowledge base"):
+            kb = st.text_area("Add context:", value=kb_text, height=100)
+        else:
+            kb = kb_text
+            if kb_text:
+                st.caption(f"{len(kb_text)} chars loaded — tick to edit")
     
     with col2:
         st.subheader("📄 PDF")
@@ -406,7 +681,8 @@ def main():
     if pdf_file:
         try:
             with st.spinner("Loading..."):
-                st.session_state.pdf_text = extract_text_from_pdf(pdf_file)
+                data = pdf_file.getvalue()
+                st.session_state.pdf_text = _extract_pdf_cached(data, pdf_file.name)
                 st.session_state.pdf_name = pdf_file.name
             st.success(f"✓ {pdf_file.name}")
         except Exception as e:
@@ -414,24 +690,35 @@ def main():
     elif st.session_state.pdf_text:
         st.info(f"Using: {st.session_state.pdf_name}")
 
-    # Chat
+    # Chat — a form batches widget state changes so the script only
+    # reruns on submit, not on every input interaction
     st.subheader("💬 Chat")
-    prompt = st.text_area("Your message:", height=100)
-    
-    send = st.button("🚀 Send", use_container_width=True, type="primary")
+    with st.form("ask_form", clear_on_submit=False):
+        prompt = st.text_area("Your message:", height=100)
+        send = st.form_submit_button("🚀 Send", use_container_width=True, type="primary")
     
     if send and prompt.strip():
-        # Build prompt
-        full_prompt = get_mode_instruction(mode)
-        if kb.strip():
-            full_prompt += f"\n\nContext:\n{kb}\n\n"
-        if st.session_state.pdf_text:
-            full_prompt += f"\n\nPDF:\n{st.session_state.pdf_text}\n\n"
-        full_prompt += prompt + get_language_instruction(language_code)
+        # Rebuild the static context prefix (mode/language instructions
+        # + KB + PDF text) only when one of its inputs changes; repeated
+        # sends with the same context reuse the cached string instead of
+        # re-concatenating potentially megabytes per message.
+        ctx_hash = hash((mode, language_code, kb, st.session_state.pdf_text))
+        if st.session_state.get("context_prefix_hash") != ctx_hash:
+            prefix = PROMPT_PREFIX.get((mode, language_code), MODE_INSTRUCTIONS["chat"])
+            if kb.strip():
+                prefix += f"\n\nContext:\n{kb}\n\n"
+            if st.session_state.pdf_text:
+                prefix += f"\n\nPDF:\n{st.session_state.pdf_text}\n\n"
+            st.session_state.context_prefix = prefix
+            st.session_state.context_prefix_hash = ctx_hash
+
+        full_prompt = st.session_state.context_prefix + prompt
         
         try:
-            with st.spinner("Getting response..."):
-                response = get_response(full_prompt)
+            # Stream tokens into the page as they arrive instead of
+            # blocking behind a spinner for the whole generation
+            with st.chat_message("assistant"):
+                response = st.write_stream(get_response_stream(full_prompt))
             
             # Save entry
             entry = {
@@ -441,31 +728,43 @@ def main():
                 "mode": mode,
                 "language": language_code,
             }
-            st.session_state.history.insert(0, entry)
+            st.session_state.history.appendleft(entry)
             
             # Save to Firebase if available, otherwise save to per-user file
             if st.session_state.user_id != "guest" and st.session_state.firebase_enabled:
                 save_user_history_to_firebase(st.session_state.user_id, entry)
             else:
-                # Save to per-user local file
-                save_chat_history(st.session_state.history, user_id=st.session_state.user_id)
+                # Append to the per-user local file
+                save_chat_history_entry(entry, user_id=st.session_state.user_id)
             
+            # No st.rerun() here: the entry is already in session history
+            # and the sections below render it on this same pass, so a
+            # forced second script run would only redo all the work (and
+            # drop the streamed response from view)
             st.success("✓ Saved")
-            st.rerun()
         except Exception as e:
             st.error(f"Error: {str(e)}")
 
+    # Adopt the background Firebase fetch once it completes. Entries sent
+    # while it was in flight stay at the front (newest first).
+    future = st.session_state.get("history_future")
+    if future is not None:
+        if future.done():
+            del st.session_state.history_future
+            # Only take what fits: the fetch is newest first and a full
+            # deque evicts from the left, so extending past maxlen would
+            # push out the newest entries rather than the oldest
+            room = HISTORY_MAXLEN - len(st.session_state.history)
+            st.session_state.history.extend(islice(future.result() or [], room))
+        else:
+            st.caption("⏳ Syncing cloud history…")
+            time.sleep(0.3)
+            st.rerun()
+
     # History
     if st.session_state.history:
         st.divider()
-        st.subheader("📜 History")
-        
-        for i, h in enumerate(st.session_state.history[:10]):
-            timestamp = h.get("timestamp", "")[:16]
-            preview = h["prompt"][:40]
-            with st.expander(f"#{i+1} ({timestamp}) - {preview}"):
-                st.write("**Q:** " + h["prompt"])
-                st.write("**A:** " + h["response"])
+        render_history(st.session_state.history)
 
     # Export
     st.divider()
@@ -473,9 +772,11 @@ def main():
     
     with col1:
         if st.session_state.history:
+            newest = st.session_state.history[0].get("timestamp", "")
+            fingerprint = (st.session_state.user_id, len(st.session_state.history), newest)
             st.download_button(
                 "📥 Export",
-                data=json.dumps(st.session_state.history, ensure_ascii=False, indent=2),
+                data=_history_blob(fingerprint, st.session_state.history),
                 file_name="history.json",
                 mime="application/json",
                 use_container_width=True
@@ -484,8 +785,8 @@ def main():
     with col2:
         if st.session_state.history:
             if st.button("🗑️ Delete All", use_container_width=True):
-                st.session_state.history = []
-                save_chat_history([], user_id=st.session_state.user_id)
+                st.session_state.history = deque(maxlen=HISTORY_MAXLEN)
+                clear_chat_history(user_id=st.session_state.user_id)
                 st.rerun()
 
 